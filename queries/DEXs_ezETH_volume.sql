@@ -1,9 +1,14 @@
 -- Title: Total ezETH Trading Volume Across Major DEXs (ID: 5301668)
+-- One row per day with a volume column per DEX, in stacking order (biggest at bottom).
+-- A DEX with no trades on a day yields NULL for that cell.
 
 SELECT
     date_trunc('day', block_time) as day,
-    project,
-    SUM(amount_usd) as total_volume_usd
+    SUM(CASE WHEN project = 'balancer' THEN amount_usd END) as balancer,
+    SUM(CASE WHEN project = 'uniswap' THEN amount_usd END) as uniswap,
+    SUM(CASE WHEN project = 'curve' THEN amount_usd END) as curve,
+    SUM(CASE WHEN project = '0x-API' THEN amount_usd END) as "0x-API",
+    SUM(CASE WHEN project = '1inch-LOP' THEN amount_usd END) as "1inch-LOP"
 FROM dex.trades
 WHERE
     blockchain = 'ethereum'
@@ -13,5 +18,5 @@ WHERE
         OR
         token_sold_address = 0xbf5495Efe5DB9ce00f80364C8B423567e58d2110 -- ezETH
     )
-GROUP BY 1, 2
-ORDER BY 1, 3 DESC
+GROUP BY 1
+ORDER BY 1
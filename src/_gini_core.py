@@ -0,0 +1,140 @@
+# Shared concentration kernels used by the operator (mod1) and AVS (mod1.5) analyses.
+# The per-group kernels are compiled with Numba so calls in the analysis loops run
+# as tight native loops instead of allocating NumPy temporaries; grouped_concentration
+# computes the same metrics for many groups at once with plain vectorized NumPy.
+
+import numpy as np
+from numba import njit
+
+# Arrays shorter than this take the fused filter-and-insertion-sort path in calculate_gini.
+SMALL_ARRAY_SIZE = 128
+
+
+@njit(cache=True)
+def calculate_hhi(shares_array):
+    """Calculates the Herfindahl-Hirschman Index from a numpy array of stake values."""
+    # Missing values are ignored, matching the pandas Series.sum() behaviour.
+    s = np.nansum(shares_array)
+    # If there are no shares, concentration is zero.
+    if s == 0:
+        return 0.0
+    # The HHI is the sum of squared percentage shares; squaring the plain fractions
+    # and scaling by 100**2 once avoids a separate percentage pass.
+    return float(np.nansum((shares_array / s) ** 2)) * 10000.0
+
+
+@njit(cache=True)
+def calculate_gini(arr):
+    """
+    Calculates the Gini coefficient of a numpy array using a stable formula.
+    """
+    if arr.size < SMALL_ARRAY_SIZE:
+        # Small arrays (typical per-AVS operator sets): filter and insertion-sort into a
+        # single buffer, skipping the boolean mask and the separate sorted copy.
+        sorted_arr = np.empty(arr.size)
+        n = 0
+        for x in arr:
+            # Negative values are invalid for this context; the comparison also skips NaNs.
+            if x >= 0:
+                j = n
+                while j > 0 and sorted_arr[j - 1] > x:
+                    sorted_arr[j] = sorted_arr[j - 1]
+                    j -= 1
+                sorted_arr[j] = x
+                n += 1
+    else:
+        # Filter out negative values (which are invalid for this context); this also drops NaNs.
+        filtered = arr[arr >= 0]
+        n = filtered.size
+        # The formula requires the array be sorted in ascending order
+        sorted_arr = np.sort(filtered)
+
+    # The Gini coefficient is undefined for empty arrays.
+    if n == 0:
+        return np.nan
+
+    # Gini coefficient formula: sum((2 * i - n - 1) * x_i) / (n * sum(x_i)), with 1-based i.
+    numerator = 0.0
+    total = 0.0
+    for i in range(n):
+        numerator += (2 * (i + 1) - n - 1) * sorted_arr[i]
+        total += sorted_arr[i]
+
+    # The Gini coefficient is undefined for all-zero arrays.
+    if total == 0:
+        return np.nan
+
+    return numerator / (n * total)
+
+
+@njit(cache=True)
+def lorenz_curve(values):
+    """
+    Returns the Lorenz curve points (x, y) of a non-empty numpy array with a positive sum.
+    """
+    sorted_arr = np.sort(values)
+    n = sorted_arr.size
+
+    # Running totals of the sorted values, with a leading 0 so the curve starts at the origin.
+    cum = np.empty(n + 1)
+    cum[0] = 0.0
+    acc = 0.0
+    for i in range(n):
+        acc += sorted_arr[i]
+        cum[i + 1] = acc
+    total = cum[n]
+
+    # x-axis: cumulative fraction of the population (operators) [0, 1/n, ..., n/n]
+    # y-axis: cumulative fraction of the total wealth (delegated stake)
+    x = np.empty(n + 1)
+    y = np.empty(n + 1)
+    for i in range(n + 1):
+        x[i] = i / n
+        y[i] = cum[i] / total
+    return x, y
+
+
+def grouped_concentration(group_ids, values, num_groups):
+    """
+    Calculates the total, HHI and Gini coefficient of many groups in one vectorized pass.
+
+    group_ids holds the group index (0..num_groups-1) of each entry in values, which
+    must be free of NaNs. As in calculate_hhi and calculate_gini, the total and HHI use
+    every value while the Gini ignores negative ones; groups summing to zero get an HHI
+    of 0, and groups without positive stake a NaN Gini.
+    """
+    # Per-group total stake and sum of squared stakes (HHI) over every value.
+    totals = np.bincount(group_ids, weights=values, minlength=num_groups)
+    squares = np.bincount(group_ids, weights=values * values, minlength=num_groups)
+    hhi = np.zeros(num_groups)
+    nonzero = totals != 0
+    hhi[nonzero] = squares[nonzero] / totals[nonzero] ** 2 * 10000.0
+
+    gini = np.full(num_groups, np.nan)
+    valid = values >= 0
+    group_ids = group_ids[valid]
+    values = values[valid]
+    if values.size == 0:
+        return totals, hhi, gini
+
+    # A single sort orders the entries by group, and by value within each group.
+    order = np.lexsort((values, group_ids))
+    ids = group_ids[order]
+    sorted_vals = values[order]
+
+    # Start offset and size of each group's run in the sorted array.
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    counts = np.diff(np.r_[starts, ids.size])
+    groups = ids[starts]
+
+    # 1-based rank of every entry within its group, and the size of that group.
+    ranks = np.arange(1, ids.size + 1) - np.repeat(starts, counts)
+    sizes = np.repeat(counts, counts)
+
+    # Per-group Gini sums: the non-negative total and the rank-weighted numerator.
+    gini_totals = np.add.reduceat(sorted_vals, starts)
+    numerators = np.add.reduceat((2 * ranks - sizes - 1) * sorted_vals, starts)
+
+    positive = gini_totals > 0
+    gini[groups[positive]] = numerators[positive] / (counts[positive] * gini_totals[positive])
+    return totals, hhi, gini
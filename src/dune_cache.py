@@ -0,0 +1,130 @@
+# This module provides a small on-disk cache for Dune query results. Results are
+# stored as zstd-compressed parquet files under .cache/dune/, keyed by the query ID
+# and its parameters, so re-running a script within the TTL skips the Dune API.
+# Each parquet file has a .meta.json sidecar recording what was fetched and when.
+# Post-processed frames built from those results can be cached under .cache/processed/,
+# so reruns that only change chart formatting skip the processing step too.
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import functools
+import pandas as pd
+
+CACHE_DIR = os.path.join(".cache", "dune")
+PROCESSED_CACHE_DIR = os.path.join(".cache", "processed")
+
+
+def cache_path(query_id, params=None):
+    """Returns the parquet path for a query ID and its (optional) parameters."""
+    key = repr((query_id, sorted((params or {}).items())))
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return os.path.join(CACHE_DIR, f"{query_id}_{digest}.parquet")
+
+
+def load_if_fresh(path, ttl_seconds):
+    """Returns the cached DataFrame if it was written within the TTL, otherwise None."""
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    if age >= ttl_seconds:
+        return None
+    return pd.read_parquet(path)
+
+
+def store(path, df, query_id, params=None):
+    """Writes a DataFrame to the cache along with its metadata sidecar."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path, compression="zstd")
+    meta = {"query_id": query_id, "params": params, "fetched_at": time.time()}
+    with open(os.path.splitext(path)[0] + ".meta.json", "w") as f:
+        json.dump(meta, f)
+
+
+def fetch_cached(fetch, query_id, params=None, ttl_seconds=3600, force_refresh=False):
+    """
+    Returns the result of fetch(query_id[, params]) through the cache.
+
+    A cached copy younger than ttl_seconds is returned without calling Dune unless
+    force_refresh is set. If the fetch fails, a stale cached copy is returned
+    instead when one exists; otherwise the error is raised.
+    """
+    path = cache_path(query_id, params)
+    if not force_refresh:
+        df = load_if_fresh(path, ttl_seconds)
+        if df is not None:
+            return df
+    try:
+        df = fetch(query_id) if params is None else fetch(query_id, params)
+    except Exception as e:
+        if not os.path.exists(path):
+            raise
+        print(f"⚠️ Dune fetch failed ({e}); falling back to stale cached results.")
+        return pd.read_parquet(path)
+    store(path, df, query_id, params)
+    return df
+
+
+def processed_cache_path(query_id, version):
+    """Returns the parquet path of a query's processed frame for a processing version."""
+    return os.path.join(PROCESSED_CACHE_DIR, f"{query_id}_v{version}.parquet")
+
+
+def processed_cached(query_id, version, build, reprocess=False):
+    """
+    Returns the processed frame for a query, building it with build() only when needed.
+
+    Frames are keyed by query ID and processing version, so bumping the version after
+    changing the processing invalidates older copies. Unlike raw results they have no
+    TTL; pass reprocess=True to rebuild from the (raw-cached) Dune results.
+    """
+    path = processed_cache_path(query_id, version)
+    if not reprocess and os.path.exists(path):
+        return pd.read_parquet(path)
+    df = build()
+    os.makedirs(PROCESSED_CACHE_DIR, exist_ok=True)
+    df.to_parquet(path, compression="zstd")
+    return df
+
+
+def cached(ttl_hours=6):
+    """
+    Decorator that caches a Dune fetch function on disk.
+
+    The wrapped function must take the query ID as its first argument and may take
+    a mapping of query parameters as its second; both form the cache key. Any
+    further arguments (sessions, clients) are passed through but not hashed.
+    Coroutine functions are supported and stay awaitable.
+    """
+    ttl_seconds = ttl_hours * 3600
+
+    def decorator(fetch):
+        def call_args(query_id, params, args):
+            # Only forward params when given, so plain fetch(query_id) functions can be wrapped too.
+            return (query_id, *args) if params is None else (query_id, params, *args)
+
+        if asyncio.iscoroutinefunction(fetch):
+            @functools.wraps(fetch)
+            async def async_wrapper(query_id, params=None, *args, **kwargs):
+                path = cache_path(query_id, params)
+                df = load_if_fresh(path, ttl_seconds)
+                if df is None:
+                    df = await fetch(*call_args(query_id, params, args), **kwargs)
+                    store(path, df, query_id, params)
+                return df
+            return async_wrapper
+
+        @functools.wraps(fetch)
+        def wrapper(query_id, params=None, *args, **kwargs):
+            path = cache_path(query_id, params)
+            df = load_if_fresh(path, ttl_seconds)
+            if df is None:
+                df = fetch(*call_args(query_id, params, args), **kwargs)
+                store(path, df, query_id, params)
+            return df
+        return wrapper
+
+    return decorator
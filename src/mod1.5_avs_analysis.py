@@ -1,42 +1,29 @@
-
 # This script analyzes the "nested" concentration of stake within the security markets
 # of individual Actively Validated Services (AVSs). It uses a parameterized Dune query
 # to fetch the operator set for each AVS and calculates concentration metrics.
-# To respect the free tier of Dune, the script uses retry logic 
-# with a cool-down period to handle standard API rate limits and errors. 
+# The queries are submitted concurrently against the Dune API, capped by a semaphore
+# to respect the free tier, with exponential backoff on standard API rate limits.
 
 import os
+import time
+import asyncio
+from collections import deque
+import aiohttp
 import pandas as pd
 from dotenv import load_dotenv
-from dune_client.types import QueryParameter
-from dune_client.client import DuneClient
-from dune_client.query import QueryBase
 import numpy as np
-import time
+from _gini_core import grouped_concentration
+from dune_cache import cached
 
 # --- 1. SETUP ---
 print("🚀 Initializing AVS Concentration Analysis...")
 load_dotenv()
-dune = DuneClient(os.getenv("DUNE_API_KEY"))
-print("✅ Dune client initialized.")
-
-# --- HHI & Gini Functions ---
-def calculate_hhi(shares):
-    if shares.sum() == 0: return 0
-    percentages = (shares / shares.sum()) * 100
-    return (percentages**2).sum()
-
-def calculate_gini(arr):
-    arr = np.asarray(arr, dtype=np.float64)
-    arr = arr[arr >= 0]
-    if arr.size == 0 or np.sum(arr) == 0: return np.nan
-    sorted_arr = np.sort(arr)
-    n = len(sorted_arr)
-    index = np.arange(1, n + 1)
-    numerator = np.sum((2 * index - n - 1) * sorted_arr)
-    denominator = n * np.sum(sorted_arr)
-    if denominator == 0: return np.nan
-    return numerator / denominator
+dune_api_key = os.getenv("DUNE_API_KEY")
+if not dune_api_key:
+    raise ValueError("DUNE_API_KEY not found. Please create a .env file with your key.")
+DUNE_API_URL = "https://api.dune.com/api/v1"
+DUNE_HEADERS = {"X-Dune-API-Key": dune_api_key}
+print("✅ Dune API key loaded.")
 
 # --- 2. CONFIGURATION ---
 # The Query ID of the MASTER parameterized query on Dune
@@ -78,83 +65,182 @@ AVS_TO_ANALYZE = {
     
 }
 
-# --- 3. ANALYSIS LOOP ---
-all_avs_results = []
+# Maximum number of executions in flight at once, and polling/retry settings.
+MAX_CONCURRENT_QUERIES = 3
+POLL_INTERVAL_SECONDS = 5
+MAX_RETRIES = 5
+# Sliding-window request budget matching the Dune free tier (calls per window, in seconds).
+RATE_LIMIT_CALLS = 60
+RATE_LIMIT_WINDOW_SECONDS = 60
+# Longest window back-off may widen it to, and how fast it shrinks back after successful calls.
+RATE_LIMIT_MAX_WINDOW_SECONDS = 8 * RATE_LIMIT_WINDOW_SECONDS
+RATE_LIMIT_RECOVERY_FACTOR = 0.9
 
-# Iterate through each AVS defined in the configuration dictionary.
-for avs_name, avs_address in AVS_TO_ANALYZE.items():
-    print(f"\nAnalyzing AVS: {avs_name}...")
-    
-    # Define the query with its parameter. The parameter name "avs_address"
-    # must match the one defined in the Dune query editor.
-    query = QueryBase(
-        query_id=MASTER_AVS_QUERY_ID,
-        params=[
-                QueryParameter.text_type(name="avs_address", value=avs_address)
-            ]
-        ) 
-    try:
-        # Execute the parameterized query.
-        avs_df = dune.run_query_dataframe(query=query)
+# --- 3. DATA ACQUISITION ---
+class RateLimiter:
+    """
+    Allows at most max_calls requests per sliding window, widening the window when throttled.
 
-    except Exception as e:
-        # Implement a retry mechanism for API rate limiting (HTTP 429)
-        if "429" in str(e):
-            print(" Rate limit hit. Waiting for a 10-second cool-down...")
-            time.sleep(10)
-            try:
-                # Second attempt after waiting
-                print(" Retrying...")
-                avs_df = dune.run_query_dataframe(query=query, performance="large")
-            except Exception as e2:
-                print(f"❌ Error on retry for {avs_name}: {e2}")
-                continue # Skip to the next AVS if the retry also fails
-        else:
-            # If it's a different kind of error, report it and skip to the next AVS
-            print(f"❌ A non-rate-limit error occurred for {avs_name}: {e}")
-            continue 
-        
+    The window doubles after each HTTP 429, up to max_window_seconds, and shrinks back
+    toward its base size with every successful call.
+    """
+
+    def __init__(self, max_calls, window_seconds, max_window_seconds):
+        self.max_calls = max_calls
+        self.base_window_seconds = window_seconds
+        self.max_window_seconds = max_window_seconds
+        self.window_seconds = window_seconds
+        self.calls = deque()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Waits only if the last max_calls requests all fall inside the current window."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                # Drop timestamps that have left the window.
+                while self.calls and now - self.calls[0] >= self.window_seconds:
+                    self.calls.popleft()
+                if len(self.calls) < self.max_calls:
+                    break
+                await asyncio.sleep(self.window_seconds - (now - self.calls[0]))
+            self.calls.append(time.monotonic())
+
+    def back_off(self):
+        """Doubles the window after an HTTP 429, lowering the sustained request rate."""
+        self.window_seconds = min(self.window_seconds * 2, self.max_window_seconds)
+
+    def recover(self):
+        """Shrinks the window back toward its base size after a successful call."""
+        self.window_seconds = max(self.window_seconds * RATE_LIMIT_RECOVERY_FACTOR, self.base_window_seconds)
+
+rate_limiter = RateLimiter(RATE_LIMIT_CALLS, RATE_LIMIT_WINDOW_SECONDS, RATE_LIMIT_MAX_WINDOW_SECONDS)
+
+async def dune_request(session, method, path, **kwargs):
+    """Sends a request to the Dune API, backing off exponentially on HTTP 429."""
+    for attempt in range(MAX_RETRIES):
+        await rate_limiter.acquire()
+        async with session.request(method, f"{DUNE_API_URL}{path}", **kwargs) as response:
+            if response.status == 429:
+                print(f" Rate limit hit. Backing off for {2**attempt} seconds...")
+                rate_limiter.back_off()
+                await asyncio.sleep(2**attempt)
+                continue
+            response.raise_for_status()
+            rate_limiter.recover()
+            return await response.json()
+    raise RuntimeError(f"Still rate limited after {MAX_RETRIES} attempts: {path}")
+
+@cached(ttl_hours=6)
+async def run_query(query_id, params, session):
+    """Executes a parameterized query, waits for it to finish and returns its rows."""
+    execution = await dune_request(session, "POST", f"/query/{query_id}/execute",
+                                   json={"query_parameters": params})
+    execution_id = execution["execution_id"]
+
+    # Poll the execution until Dune reports a terminal state.
+    while True:
+        status = await dune_request(session, "GET", f"/execution/{execution_id}/status")
+        state = status["state"]
+        if state == "QUERY_STATE_COMPLETED":
+            break
+        if state in ("QUERY_STATE_FAILED", "QUERY_STATE_CANCELLED", "QUERY_STATE_EXPIRED"):
+            raise RuntimeError(f"Execution {execution_id} ended in state {state}")
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    results = await dune_request(session, "GET", f"/execution/{execution_id}/results")
+    result = results["result"]
+    # Pass the column names explicitly so an AVS without operators still yields the expected columns.
+    return pd.DataFrame(result["rows"], columns=result["metadata"]["column_names"])
+
+async def fetch(session, semaphore, avs_name, avs_address):
+    """Fetches the operator set of a single AVS, returning None on failure."""
+    async with semaphore:
+        print(f"Submitting query for AVS: {avs_name}...")
+        try:
+            # The parameter name "avs_address" must match the one defined in the Dune query editor.
+            avs_df = await run_query(MASTER_AVS_QUERY_ID, {"avs_address": avs_address}, session)
+        except Exception as e:
+            print(f"❌ Error fetching data for {avs_name}: {e}")
+            return None
     print(f"✅ Successfully fetched data for {avs_name}. Found {len(avs_df)} operators.")
-        
+    return avs_df
+
+async def fetch_all():
+    """Submits the queries for every AVS concurrently and returns the results in order."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+    async with aiohttp.ClientSession(headers=DUNE_HEADERS) as session:
+        return await asyncio.gather(
+            *(fetch(session, semaphore, avs_name, avs_address) for avs_name, avs_address in AVS_TO_ANALYZE.items())
+        )
+
+avs_frames = asyncio.run(fetch_all())
+
+# --- 4. ANALYSIS LOOP ---
+# Preallocate one typed column per metric; rows are filled in order and the
+# unused tail (AVSs that failed) is sliced off when building the summary.
+# The operator stakes of every AVS are collected, tagged with the AVS's row,
+# so the metrics can be computed for all AVSs in a single vectorized pass.
+num_avs = len(AVS_TO_ANALYZE)
+names = np.empty(num_avs, dtype=object)
+num_ops = np.empty(num_avs, dtype=np.int32)
+stake = np.empty(num_avs, dtype=np.float64)
+hhi_arr = np.empty(num_avs, dtype=np.float64)
+gini_arr = np.empty(num_avs, dtype=np.float64)
+num_results = 0
+stake_ids = []
+stake_vals = []
+
+# Iterate through each AVS defined in the configuration dictionary.
+for avs_name, avs_df in zip(AVS_TO_ANALYZE, avs_frames):
+    # Skip AVSs whose data could not be fetched.
+    if avs_df is None:
+        continue
+
     try:
-        # Perform the concentration calculations.
         delegated_col = 'USD value Delegated'
 
-        avs_df[delegated_col] = pd.to_numeric(avs_df[delegated_col], errors='coerce')
-        num_operators = len(avs_df)
-        total_stake_usd = avs_df[delegated_col].sum()
-        hhi = calculate_hhi(avs_df[delegated_col])
-        gini = calculate_gini(avs_df[delegated_col].values)
-        
-        # Store the results in a list of dictionaries.
-        all_avs_results.append({
-            "Market": avs_name,
-            "Number of Operators": num_operators,
-            "Total Delegated USD (Proxy)": f"${total_stake_usd:,.0f}",
-            "HHI (Proxy)": f"{hhi:,.2f}",
-            "Gini (Proxy)": f"{gini:.4f}"
-        })
+        # Convert the stakes to a float array once and drop missing values, as mod1 does.
+        vals = pd.to_numeric(avs_df[delegated_col], errors='coerce').to_numpy(dtype=np.float64, copy=False)
+        vals = vals[~np.isnan(vals)]
+
+        names[num_results] = avs_name
+        num_ops[num_results] = len(avs_df)
+        stake_ids.append(np.full(vals.size, num_results))
+        stake_vals.append(vals)
+        num_results += 1
         
     except Exception as e:
         print(f"❌ Error analyzing {avs_name}: {e}")
-    
-    # Pause between API calls to respect rate limits.
-    print("Pausing for 3 seconds to respect API rate limits...")
-    time.sleep(3)
 
-# --- 4. FINAL OUTPUT ---
+# --- 5. FINAL OUTPUT ---
 output_dir = "outputs"
 module_output_dir = os.path.join(output_dir, "module1.5_AVS_concentration")
 if not os.path.exists(module_output_dir):
     os.makedirs(module_output_dir)
     print(f"\n📁 Created output directory: {module_output_dir}")
 
-if all_avs_results:
-    summary_df = pd.DataFrame(all_avs_results)
+if num_results:
+    # Perform the concentration calculations for all AVSs at once; the raw numeric
+    # results are stored and formatting is applied only when printing.
+    stake[:num_results], hhi_arr[:num_results], gini_arr[:num_results] = grouped_concentration(
+        np.concatenate(stake_ids), np.concatenate(stake_vals), num_results
+    )
+    summary_df = pd.DataFrame({
+        "Market": names[:num_results],
+        "Number of Operators": num_ops[:num_results],
+        "Total Delegated USD (Proxy)": stake[:num_results],
+        "HHI (Proxy)": hhi_arr[:num_results],
+        "Gini (Proxy)": gini_arr[:num_results]
+    })
     print("\n\n==================================================")
     print("   AVS Operator Concentration Analysis Summary")
     print("==================================================")
-    print(summary_df.to_string(index=False))
+    print(summary_df.to_string(index=False, formatters={
+        "Total Delegated USD (Proxy)": "${:,.0f}".format,
+        "HHI (Proxy)": "{:,.2f}".format,
+        "Gini (Proxy)": "{:.4f}".format
+    }))
     
     # Save the final results to a CSV file for later use in visualization.
     summary_path = os.path.join(module_output_dir, 'avs_concentration_summary.csv')
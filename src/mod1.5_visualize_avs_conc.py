@@ -17,7 +17,8 @@ output_dir = "module1.5_outputs"
 # --- 2. DATA LOADING AND PREPARATION ---
 try:
     # Read the data from the CSV generated by the previous script.
-    avs_summary_df = pd.read_csv(input_csv, thousands=',')
+    # The analysis script stores numeric columns, so no string parsing is needed.
+    avs_summary_df = pd.read_csv(input_csv)
     print(f"✅ Successfully loaded data from '{input_csv}'.")
 except FileNotFoundError:
     print(f"❌ Error: The file '{input_csv}' was not found.")
@@ -32,8 +33,7 @@ overall_market_data = pd.DataFrame([{
 
 # Combine theAVS data with the overall market data.
 plot_df = pd.concat([avs_summary_df, overall_market_data], ignore_index=True)
-# Ensure HHI is numeric and sort by HHI for clean visual presentation.
-plot_df['HHI (Proxy)'] = pd.to_numeric(plot_df['HHI (Proxy)'], errors='coerce')
+# Sort by HHI for clean visual presentation.
 plot_df = plot_df.sort_values(by='HHI (Proxy)', ascending=True).dropna(subset=['HHI (Proxy)'])
 
 # --- 3. VISUALIZATION ---
@@ -97,9 +97,10 @@ if not os.path.exists(output_dir):
     os.makedirs(output_dir)
     print(f"📁 Created output directory: {output_dir}")
 
-# Save the interactive chart to an HTML file.
+# Save the interactive chart to an HTML file, loading plotly.js from the CDN
+# instead of embedding the full bundle in the file.
 avs_html_path = os.path.join(output_dir, "avs_hhi_concentration_chart.html")
-fig_avs.write_html(avs_html_path)
+fig_avs.write_html(avs_html_path, include_plotlyjs='cdn', full_html=True)
 fig_avs.show()
 
 print(f"✅ AVS concentration chart saved to '{avs_html_path}'")
\ No newline at end of file
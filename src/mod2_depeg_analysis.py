@@ -4,17 +4,21 @@
 # the data to create a multi-panel narrative chart of the crisis.
 
 import os
+import asyncio
 import pandas as pd
 from dotenv import load_dotenv
 from dune_client.client import DuneClient
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from dune_cache import cached
 
 # --- 1. SETUP ---
 print("🚀 Initializing script...")
 load_dotenv()
 dune = DuneClient(os.getenv("DUNE_API_KEY"))
 print("✅ Dune client initialized.")
+# Serve repeated fetches from the on-disk cache while the results are fresh.
+get_latest_result_dataframe = cached(ttl_hours=6)(dune.get_latest_result_dataframe)
 
 # --- 2. DATA ACQUISITION ---
 # Define the Dune Query IDs for the various datasets needed for the analysis.
@@ -22,22 +26,36 @@ QUERY_ID_PRICE_VOLUME = 5299669 # Minute-by-minute price and volume from Balance
 QUERY_ID_WETH_DRAIN = 5299808 # Cumulative WETH drained from the Balancer pool.
 QUERY_ID_MORPHO_LIQS = 5323305 # Daily liquidations on Morpho Blue.
 QUERY_ID_BLAST_FLOWS = 5306342 # Daily deposits/withdrawals from Blast L2 vault.
+# Dune returns timestamps as text such as "2024-04-24 00:00:00.000 UTC".
+DUNE_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f %Z'
+
+async def fetch(query_id):
+    """Fetches a single dataset in a worker thread so the requests can overlap."""
+    return await asyncio.to_thread(get_latest_result_dataframe, query_id)
+
+async def fetch_all():
+    """Fetches the four independent datasets concurrently."""
+    return await asyncio.gather(
+        fetch(QUERY_ID_PRICE_VOLUME),
+        fetch(QUERY_ID_WETH_DRAIN),
+        fetch(QUERY_ID_MORPHO_LIQS),
+        fetch(QUERY_ID_BLAST_FLOWS)
+    )
 
 print("Fetching data from Dune...")
-# Fetch all datasets and load them into pandas DataFrames.
-price_vol_df = dune.get_latest_result_dataframe(QUERY_ID_PRICE_VOLUME)
-weth_drain_df = dune.get_latest_result_dataframe(QUERY_ID_WETH_DRAIN)
-morpho_liqs_df = dune.get_latest_result_dataframe(QUERY_ID_MORPHO_LIQS)
-blast_flows_df = dune.get_latest_result_dataframe(QUERY_ID_BLAST_FLOWS)
+# Fetch all datasets concurrently and load them into pandas DataFrames.
+price_vol_df, weth_drain_df, morpho_liqs_df, blast_flows_df = asyncio.run(fetch_all())
 print("✅ Successfully fetched all dataframes from Dune.")
 
 # --- 3. DATA PROCESSING ---
 print("Processing and cleaning data...")
 # Convert all time/date columns to datetime objects for proper plotting.
-price_vol_df['minute'] = pd.to_datetime(price_vol_df['minute'])
-weth_drain_df['minute'] = pd.to_datetime(weth_drain_df['minute'])
-morpho_liqs_df['day'] = pd.to_datetime(morpho_liqs_df['day'])
-blast_flows_df['day'] = pd.to_datetime(blast_flows_df['day'])
+# An explicit format skips pandas' per-value format inference, and cache=True parses
+# each distinct timestamp only once (daily columns repeat the same few values).
+price_vol_df['minute'] = pd.to_datetime(price_vol_df['minute'], format=DUNE_TIMESTAMP_FORMAT, utc=True, cache=True)
+weth_drain_df['minute'] = pd.to_datetime(weth_drain_df['minute'], format=DUNE_TIMESTAMP_FORMAT, utc=True, cache=True)
+morpho_liqs_df['day'] = pd.to_datetime(morpho_liqs_df['day'], format=DUNE_TIMESTAMP_FORMAT, utc=True, cache=True)
+blast_flows_df['day'] = pd.to_datetime(blast_flows_df['day'], format=DUNE_TIMESTAMP_FORMAT, utc=True, cache=True)
 
 # Resample minute-by-minute volume to hourly sums to reduce clutter in the volume chart.
 hourly_volume_df = price_vol_df.set_index('minute')['volume_usd'].resample('1H').sum().reset_index()
@@ -49,11 +67,13 @@ blast_flows_df['gross_withdrawals_abs'] = blast_flows_df['gross_withdrawals'].ab
 # This ensures that days with zero liquidations are still plotted as zero.
 # 1. Create a complete, daily date range that matches the main plot's visible range
 date_range = pd.date_range(start=price_vol_df['minute'].min(), end=price_vol_df['minute'].max(), freq='D')
-scaffold_df = pd.DataFrame(date_range, columns=['day'])
-# 2. Merge liquidation data onto this complete daily "scaffold"
-morpho_aligned_df = pd.merge(scaffold_df, morpho_liqs_df, on='day', how='left')
-# 3. Fill the days with no liquidations with 0
-morpho_aligned_df['total_usd_liquidated'] = morpho_aligned_df['total_usd_liquidated'].fillna(0)
+# 2. Reindex the liquidation data onto this range, filling days with no liquidations with 0
+morpho_aligned_df = (
+    morpho_liqs_df.set_index('day')
+    .reindex(date_range, fill_value=0)
+    .rename_axis('day')
+    .reset_index()
+)
 
 
 # --- 4. VISUALIZATION ---
@@ -74,12 +94,12 @@ fig_mainnet = make_subplots(
     )
 )
 
-# PLOT 1A: Price Ratio
-fig_mainnet.add_trace(go.Scatter(x=price_vol_df['minute'], y=price_vol_df['price_ratio_weth'], name='ezETH/WETH Price Ratio', line=dict(color='#4A55A2', width=2)), row=1, col=1)
+# PLOT 1A: Price Ratio (WebGL trace, so every minute, including the trough, stays responsive)
+fig_mainnet.add_trace(go.Scattergl(x=price_vol_df['minute'], y=price_vol_df['price_ratio_weth'], name='ezETH/WETH Price Ratio', line=dict(color='#4A55A2', width=2)), row=1, col=1)
 fig_mainnet.add_hline(y=1.0, line_dash="dash", line_color="grey", row=1, col=1, annotation_text="Peg", annotation_position="bottom right")
 
 # PLOT 1B: WETH Drain
-fig_mainnet.add_trace(go.Scatter(x=weth_drain_df['minute'], y=weth_drain_df['cumulative_weth_drained'], name='Cumulative WETH Drained', line=dict(color='#C51605', width=2, dash='dot')), row=1, col=1, secondary_y=True)
+fig_mainnet.add_trace(go.Scattergl(x=weth_drain_df['minute'], y=weth_drain_df['cumulative_weth_drained'], name='Cumulative WETH Drained', line=dict(color='#C51605', width=2, dash='dot')), row=1, col=1, secondary_y=True)
 
 # PLOT 2: Trading Volume
 fig_mainnet.add_trace(go.Bar(
@@ -157,7 +177,9 @@ fig_blast.show()
 
 mainnet_html_path = os.path.join(module_output_dir, "ezETH_depeg_mainnet_analysis.html")
 blast_html_path = os.path.join(module_output_dir, "ezETH_depeg_blast_contagion.html")
-fig_mainnet.write_html(mainnet_html_path)
-fig_blast.write_html(blast_html_path)
+# Both charts reference a single plotly.min.js written beside them rather than
+# each embedding its own copy of the bundle.
+fig_mainnet.write_html(mainnet_html_path, include_plotlyjs='directory')
+fig_blast.write_html(blast_html_path, include_plotlyjs='directory')
 
 print(f"✅ Interactive HTML charts saved to '{module_output_dir}'.")
\ No newline at end of file
@@ -0,0 +1,54 @@
+# This script regenerates the static Module 2 figures (market-wide DEX volume and
+# Morpho Blue liquidations) in a single process. Processed data cached by earlier runs
+# is reused; the Dune queries for anything that must be rebuilt are fetched
+# concurrently, then each dataset is handed to its plotting function.
+
+import os
+import argparse
+from dune_fetch import fetch_many
+from dune_cache import processed_cache_path, processed_cached
+from plotting_common import show_or_close
+import visualize_dex_volume as dex
+import visualize_morpho_liqs as morpho
+
+# Each figure's query ID, processing version, and processing and plotting functions.
+FIGURES = [
+    (dex.QUERY_ID_DEX_VOLUME, dex.PROCESSING_VERSION, dex.process_dex_volume, dex.plot_dex_volume),
+    (morpho.QUERY_ID_MORPHO_LIQS_FOCUSED, morpho.PROCESSING_VERSION,
+     morpho.process_morpho_liquidations, morpho.plot_morpho_liquidations),
+]
+
+# Each figure must write its own files; a copy-pasted name would silently overwrite another chart.
+FIGURE_NAMES = [dex.FIGURE_NAME, morpho.FIGURE_NAME]
+if len(set(FIGURE_NAMES)) != len(FIGURE_NAMES):
+    raise ValueError(f"Module 2 figures must have unique output names: {FIGURE_NAMES}")
+
+def generate_module2_figures(force_refresh=False, reprocess=False):
+    """
+    Fetches the datasets that need (re)processing at once, renders each figure and
+    returns the figures. Callers own them and should close them (see show_or_close).
+    """
+    # Fresh Dune results always have to be reprocessed.
+    reprocess = reprocess or force_refresh
+    to_fetch = [query_id for query_id, version, _, _ in FIGURES
+                if reprocess or not os.path.exists(processed_cache_path(query_id, version))]
+    frames = {}
+    if to_fetch:
+        print("Fetching DEX volume and liquidation data from Dune...")
+        frames = fetch_many(to_fetch, force_refresh=force_refresh)
+        print("✅ Successfully fetched data.")
+
+    figures = []
+    for query_id, version, process, plot in FIGURES:
+        # build() only runs for the queries fetched above.
+        figures.append(plot(processed_cached(query_id, version, lambda: process(frames[query_id]), reprocess=reprocess)))
+    return figures
+
+if __name__ == "__main__":
+    print("📊 Initializing Module 2 Figure Generation...")
+    parser = argparse.ArgumentParser(description="Regenerate the static Module 2 figures.")
+    parser.add_argument("--force-refresh", action="store_true", help="Ignore cached Dune results and fetch them again.")
+    parser.add_argument("--reprocess", action="store_true", help="Rebuild the cached processed data from the Dune results.")
+    args = parser.parse_args()
+
+    show_or_close(*generate_module2_figures(force_refresh=args.force_refresh, reprocess=args.reprocess))
@@ -0,0 +1,71 @@
+# Shared matplotlib setup for the static Module 2 figures. Importing this module
+# selects the backend and applies the chart style once per process, so scripts
+# rendered together by mod2_figures.py do not repeat the setup.
+
+import os
+import sys
+import calendar
+import numpy as np
+import matplotlib
+# Use the non-interactive Agg backend when running headless (no terminal to show figures in).
+if not sys.stdout.isatty():
+    matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+plt.style.use('seaborn-v0_8-whitegrid')
+# The styled rcParams, reapplied in one batch before each figure instead of re-parsing
+# the style file. The backend is left out so reapplying never switches it.
+_STYLE_SNAPSHOT = {key: value for key, value in plt.rcParams.items() if key != 'backend'}
+
+# Five evenly spaced viridis colors, one per DEX in the stacked volume chart.
+VIRIDIS5 = plt.get_cmap('viridis')(np.linspace(0, 1, 5))
+
+def apply_style():
+    """Restores the shared chart style, undoing any rcParams changes made since import."""
+    plt.rcParams.update(_STYLE_SNAPSHOT)
+
+def make_axes(figsize):
+    """Creates a figure with a single axes in the shared style."""
+    apply_style()
+    return plt.subplots(figsize=figsize)
+
+def date_labels(days):
+    """Formats a numpy datetime64 array as 'Apr 23'-style tick labels."""
+    # datetime_as_string formats the whole array at once as 'YYYY-MM-DD'.
+    return [f"{calendar.month_abbr[int(d[5:7])]} {d[8:10]}" for d in np.datetime_as_string(days, unit='D')]
+
+def show_or_close(*figs):
+    """
+    Shows the figures when running interactively with a display, otherwise closes them.
+
+    Closing releases each figure's canvas and renderer buffers right away, so batch runs
+    hold at most the figures still being drawn.
+    """
+    # Without a display (no $DISPLAY on Linux, CI, piped output) matplotlib runs on Agg.
+    if sys.stdout.isatty() and matplotlib.get_backend().lower() != 'agg':
+        plt.show()
+    else:
+        for fig in figs:
+            plt.close(fig)
+
+def label_yticks_in_millions(ax):
+    """Labels the current y ticks as '$5M'-style strings, formatted once instead of per draw."""
+    # Call after plotting: the ticks and limits are frozen at their current values.
+    ylim = ax.get_ylim()
+    ticks = [t for t in ax.get_yticks() if ylim[0] <= t <= ylim[1]]
+    ax.set_yticks(ticks, [f'${t/1e6:,.0f}M' for t in ticks])
+    ax.set_ylim(ylim)
+
+def save_fig(fig, name, module='module2_depeg_analysis'):
+    """
+    Saves a figure as outputs/<module>/<name>.svg and .png and returns the path without
+    the extension.
+    """
+    output_path = os.path.join("outputs", module, name)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # The SVG is the print-quality copy and needs no rasterization; the PNG is for web and
+    # doc embedding, where 150 dpi and zlib level 1 keep encoding cheap.
+    fig.savefig(output_path + '.svg', bbox_inches=None)
+    fig.savefig(output_path + '.png', dpi=150, bbox_inches=None,
+                pil_kwargs={'optimize': False, 'compress_level': 1})
+    return output_path
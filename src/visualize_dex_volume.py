@@ -2,77 +2,93 @@
 # This script fetches daily trading volume for ezETH across all major decentralized
 # exchanges (DEXs) during the crisis week. It processes the data and generates a
 # stacked bar chart to provide context for the case study's focus on Balancer.
+# The plotting function is also used by mod2_figures.py to render all Module 2 figures.
 
-import os
-import pandas as pd
-from dotenv import load_dotenv
-from dune_client.client import DuneClient
+import argparse
+import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.dates as mdates
-
-# --- 1. SETUP ---
-# Initialize script and connect to Dune API.
-print("📊 Initializing Market-Wide DEX Volume Visualization Script...")
-load_dotenv()
-dune = DuneClient(os.getenv("DUNE_API_KEY"))
+from plotting_common import VIRIDIS5, date_labels, label_yticks_in_millions, make_axes, save_fig, show_or_close
+from dune_fetch import fetch_many
+from dune_cache import processed_cached
 
 # The ID for the Dune query that aggregates daily volume by DEX project.
 QUERY_ID_DEX_VOLUME = 5301668
+# The DEX volume columns returned by the query, in stacking order.
+DEX_ORDER = ['balancer', 'uniswap', 'curve', '0x-API', '1inch-LOP']
+# The base name of the saved chart files.
+FIGURE_NAME = "figure_market_wide_dex_volume"
+# Bump whenever process_dex_volume changes, so cached processed frames are rebuilt.
+PROCESSING_VERSION = 1
+
+def process_dex_volume(dex_volume_df):
+    """Turns the raw DEX volume results into a frame indexed by day with one column per DEX."""
+    # --- 3. DATA PROCESSING ---
+    # This section transforms the data into the correct format for a stacked bar chart.
+    # The query already returns one row per day with a volume column per DEX.
+    # Dune timestamps start with the date ('2024-04-23 00:00:00.000 UTC').
+    days = np.asarray(dex_volume_df['day'], dtype=str).astype('U10').astype('datetime64[D]')
+    # Keep the columns in stacking order, zero-filling the days on which a DEX had no trades.
+    return dex_volume_df[DEX_ORDER].astype(float).fillna(0).set_index(days).rename_axis('day')
+
+def plot_dex_volume(pivot_df):
+    """Saves the stacked bar chart of a processed DEX volume frame."""
+    # With only a handful of rows, plain numpy arrays are all the chart needs.
+    days = pivot_df.index.to_numpy()
+    volumes = {name: pivot_df[name].to_numpy() for name in DEX_ORDER}
 
-# --- 2. DATA ACQUISITION ---
-# Get the query results from Dune's API.
-print("Fetching DEX volume data from Dune...")
-try:
-    dex_volume_df = dune.get_latest_result_dataframe(QUERY_ID_DEX_VOLUME)
-    print("✅ Successfully fetched data.")
-except Exception as e:
-    print(f"❌ Error fetching data: {e}")
-    exit()
+    # --- 4. VISUALIZATION ---
+    print("🎨 Generating chart...")
+    fig, ax = make_axes(figsize=(12, 8))
 
-# --- 3. DATA PROCESSING ---
-# This section transforms the data into the correct format for a stacked bar chart.
-dex_volume_df['day'] = pd.to_datetime(dex_volume_df['day'])
-# Pivot the data: transform the 'project' column into separate columns for each DEX,
-# with the values being the total trading volume. This is the standard format for stacking.
-pivot_df = dex_volume_df.pivot(index='day', columns='project', values='total_volume_usd').fillna(0)
-# Ensure the columns are in a logical order for stacking (biggest at bottom)
-pivot_df = pivot_df[['balancer', 'uniswap', 'curve', '0x-API', '1inch-LOP']]
+    # Create the stacked bar chart, one layer per DEX in stacking order (biggest at bottom).
+    positions = np.arange(days.size)
+    bottom = np.zeros(days.size)
+    for name, color in zip(DEX_ORDER, VIRIDIS5):
+        ax.bar(positions, volumes[name], width=0.5, bottom=bottom, label=name, color=color)
+        bottom += volumes[name]
 
-# --- 4. VISUALIZATION ---
-print("🎨 Generating chart...")
-plt.style.use('seaborn-v0_8-whitegrid')
-fig, ax = plt.subplots(figsize=(12, 8))
+    # Formatting
+    ax.set_title('Daily ezETH Trading Volume by DEX Surrounding the Crisis Period', fontsize=18, weight='bold')
+    ax.set_xlabel('Date', fontsize=14)
+    ax.set_ylabel('Trading Volume (USD)', fontsize=14)
+    # Format y-axis in millions of dollars.
+    label_yticks_in_millions(ax)
+    ax.legend(title='DEX Project', fontsize=11, title_fontsize=12)
+    plt.xticks(rotation=0, ha='center', fontsize=12)
+    plt.yticks(fontsize=12)
+    # Label each bar with its date
+    ax.set_xticks(positions, date_labels(days))
+    plt.tight_layout(pad=1.5)
 
-# Create the stacked bar chart
-pivot_df.plot(
-    kind='bar',
-    stacked=True,
-    ax=ax,
-    colormap='viridis' 
-)
+    # --- 5. OUTPUT ---
+    output_path = save_fig(fig, FIGURE_NAME)
+    print(f"✅ Chart saved to '{output_path}.png' and '{output_path}.svg'")
+    return fig
 
-# Formatting
-ax.set_title('Daily ezETH Trading Volume by DEX Surrounding the Crisis Period', fontsize=18, weight='bold')
-ax.set_xlabel('Date', fontsize=14)
-ax.set_ylabel('Trading Volume (USD)', fontsize=14)
-# Format y-axis in millions of dollars.
-ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, p: f'${y/1e6:,.0f}M'))
-ax.legend(title='DEX Project', fontsize=11, title_fontsize=12)
-plt.xticks(rotation=0, ha='center', fontsize=12)
-plt.yticks(fontsize=12)
-# Use the dates from the index for x-tick labels
-ax.set_xticklabels(pivot_df.index.strftime('%b %d'))
-plt.tight_layout(pad=1.5)
+def main():
+    # --- 1. SETUP ---
+    print("📊 Initializing Market-Wide DEX Volume Visualization Script...")
+    parser = argparse.ArgumentParser(description="Plot daily ezETH DEX volume around the de-peg.")
+    parser.add_argument("--force-refresh", action="store_true", help="Ignore cached Dune results and fetch them again.")
+    parser.add_argument("--reprocess", action="store_true", help="Rebuild the cached processed data from the Dune results.")
+    args = parser.parse_args()
 
-# --- 5. OUTPUT ---
-output_dir = "outputs"
-module_output_dir = os.path.join(output_dir, "module2_depeg_analysis")
+    # --- 2. DATA ACQUISITION ---
+    # Reuse the processed data from a previous run unless asked to rebuild it. Dune is only
+    # queried when rebuilding, reusing results cached within the last hour.
+    print("Loading DEX volume data...")
+    try:
+        pivot_df = processed_cached(
+            QUERY_ID_DEX_VOLUME, PROCESSING_VERSION,
+            lambda: process_dex_volume(fetch_many([QUERY_ID_DEX_VOLUME], force_refresh=args.force_refresh)[QUERY_ID_DEX_VOLUME]),
+            reprocess=args.reprocess or args.force_refresh,
+        )
+        print("✅ Successfully loaded data.")
+    except Exception as e:
+        print(f"❌ Error fetching data: {e}")
+        exit()
 
-if not os.path.exists(module_output_dir):
-    os.makedirs(module_output_dir)
-output_path = os.path.join(module_output_dir, "figure_market_wide_dex_volume.png")
-plt.savefig(output_path, dpi=300)
-print(f"✅ Chart saved to '{output_path}'")
+    show_or_close(plot_dex_volume(pivot_df))
 
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
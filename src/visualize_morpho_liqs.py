@@ -1,88 +1,102 @@
-
 # This script fetches pre-aggregated daily liquidation data for ezETH on Morpho Blue
 # during the April 2024 crisis week. It generates a static bar chart to be
 # used as a key piece of evidence (Figure 4.9) in the case study analysis.
+# The plotting function is also used by mod2_figures.py to render all Module 2 figures.
 
-import os
+import argparse
+import numpy as np
 import pandas as pd
-from dotenv import load_dotenv
-from dune_client.client import DuneClient
 import matplotlib.pyplot as plt
-import seaborn as sns
+from plotting_common import date_labels, label_yticks_in_millions, make_axes, save_fig, show_or_close
+from dune_fetch import fetch_many
+from dune_cache import processed_cached
 
-# --- 1. SETUP ---
-# Initialize the script and establish the connection to the Dune API.
-print("📊 Initializing Morpho Liquidations Visualization Script...")
-load_dotenv()
-dune = DuneClient(os.getenv("DUNE_API_KEY"))
 # The ID for the Dune query that aggregates liquidations specifically for the crisis week.
 QUERY_ID_MORPHO_LIQS_FOCUSED = 5323305
+# The base name of the saved chart files.
+FIGURE_NAME = "figure_morpho_liquidations"
+# Bump whenever process_morpho_liquidations changes, so cached processed frames are rebuilt.
+PROCESSING_VERSION = 1
+
+def process_morpho_liquidations(liquidations_df):
+    """Aligns the daily liquidation results to the crisis week, indexed by day."""
+    # --- 3. DATA PROCESSING ---
+    # This section ensures the data is clean and correctly formatted for plotting.
+    # Convert the 'day' column from text to proper datetime objects.
+    liquidations_df['day'] = pd.to_datetime(liquidations_df['day'])
+
+    # Align the data to the full crisis week to provide context for days with zero liquidations.
+    # This prevents the plotting library from misinterpreting a single data point.
+    # The range is in UTC to match the Dune data.
+    date_range = pd.date_range(start='2024-04-23', end='2024-04-26', freq='D', tz='UTC')
 
-# --- 2. DATA ACQUISITION ---
-# Get the query results from Dune's API and load them into a pandas DataFrame.
-print("Fetching liquidation data from Dune...")
-try:
-    liquidations_df = dune.get_latest_result_dataframe(QUERY_ID_MORPHO_LIQS_FOCUSED)
-    print("✅ Successfully fetched data.")
-except Exception as e:
-    print(f"❌ Error fetching data: {e}")
-    exit()
+    # Reindex the liquidation data onto the range. Days without liquidations will have zero values.
+    return (
+        liquidations_df.set_index('day')
+        .reindex(date_range, fill_value=0)
+        .rename_axis('day')
+    )
 
-# --- 3. DATA PROCESSING ---
-# This section ensures the data is clean and correctly formatted for plotting.
-# Convert the 'day' column from text to proper datetime objects.
-liquidations_df['day'] = pd.to_datetime(liquidations_df['day'])
+def plot_morpho_liquidations(aligned_df):
+    """Saves the bar chart of the processed, crisis-week-aligned liquidations."""
+    # --- 4. VISUALIZATION ---
+    # This section generates the final, publication-quality static chart.
+    print("🎨 Generating chart...")
+    fig, ax = make_axes(figsize=(12, 7))
 
-# Create a "date scaffold" to provide context for days with zero liquidations.
-# This prevents the plotting library from misinterpreting a single data point.
-date_range = pd.date_range(start='2024-04-23', end='2024-04-26', freq='D')
-scaffold_df = pd.DataFrame(date_range, columns=['day'])
-# Ensure the scaffold's timezone matches the Dune data (UTC) to allow for a successful merge.
-scaffold_df['day'] = pd.to_datetime(scaffold_df['day']).dt.tz_localize('UTC')
+    # Create the bar plot with one bar per day at integer positions, labeled with the dates.
+    # The color is #E55807 at 75% saturation, as seaborn's barplot rendered it previously.
+    heights = aligned_df['total_usd_liquidated'].to_numpy(dtype=float)
+    positions = np.arange(heights.size)
+    bars = ax.bar(positions, heights, width=0.8, color='#C95F23')
+    ax.set_xticks(positions, date_labels(aligned_df.index.values))
+    ax.set_xlim(-0.5, heights.size - 0.5)
+    ax.xaxis.grid(False)
 
-# Merge the liquidation data onto the scaffold. Days without liquidations will have zero values.
-aligned_df = pd.merge(scaffold_df, liquidations_df, on='day', how='left').fillna(0)
-# Create a clean, text-based label for the x-axis to ensure correct categorical plotting.
-aligned_df['date_label'] = aligned_df['day'].dt.strftime('%b %d')
+    # Add data labels on top of the bars, leaving days without liquidations unlabeled.
+    # bar_label anchors a label's bottom edge, so 3pt of padding puts the centre of the
+    # 12pt text 9pt above the bar, where it sat before.
+    labels = [f'${h/1e6:.1f}M' if h > 0 else '' for h in heights]
+    ax.bar_label(bars, labels=labels, padding=3, fontsize=12, fontweight='bold')
 
-# --- 4. VISUALIZATION ---
-# This section generates the final, publication-quality static chart.
-print("🎨 Generating chart...")
-plt.style.use('seaborn-v0_8-whitegrid')
-fig, ax = plt.subplots(figsize=(12, 7))
+    # Formatting
+    ax.set_title('Daily ezETH Liquidations on Morpho Blue', fontsize=18, weight='bold')
+    ax.set_xlabel('Date', fontsize=14)
+    ax.set_ylabel('Value Liquidated (USD)', fontsize=14)
+    label_yticks_in_millions(ax)
+    plt.xticks(rotation=0, fontsize=12) 
+    plt.tight_layout(pad=1.5)
 
-# Create the bar plot using the prepared string labels for the x-axis.
-bar_plot = sns.barplot(
-    data=aligned_df,
-    x='date_label', 
-    y='total_usd_liquidated',
-    ax=ax,
-    color='#E55807'
-)
+    # --- 5. OUTPUT ---
+    output_path = save_fig(fig, FIGURE_NAME)
+    print(f"✅ Chart saved to '{output_path}.png' and '{output_path}.svg'")
+    return fig
 
-# Add data labels on top of the bars
-for p in bar_plot.patches:
-    if p.get_height() > 0:
-        ax.annotate(f'${p.get_height()/1e6:.1f}M', 
-                       (p.get_x() + p.get_width() / 2., p.get_height()), 
-                       ha = 'center', va = 'center', xytext = (0, 9), textcoords = 'offset points',
-                       fontsize=12, weight='bold')
+def main():
+    # --- 1. SETUP ---
+    print("📊 Initializing Morpho Liquidations Visualization Script...")
+    parser = argparse.ArgumentParser(description="Plot daily ezETH liquidations on Morpho Blue.")
+    parser.add_argument("--force-refresh", action="store_true", help="Ignore cached Dune results and fetch them again.")
+    parser.add_argument("--reprocess", action="store_true", help="Rebuild the cached processed data from the Dune results.")
+    args = parser.parse_args()
 
-# Formatting
-ax.set_title('Daily ezETH Liquidations on Morpho Blue', fontsize=18, weight='bold')
-ax.set_xlabel('Date', fontsize=14)
-ax.set_ylabel('Value Liquidated (USD)', fontsize=14)
-ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, p: f'${y/1e6:,.0f}M'))
-plt.xticks(rotation=0, fontsize=12) 
-plt.tight_layout(pad=1.5)
+    # --- 2. DATA ACQUISITION ---
+    # Reuse the processed data from a previous run unless asked to rebuild it. Dune is only
+    # queried when rebuilding, reusing results cached within the last hour.
+    print("Loading liquidation data...")
+    try:
+        aligned_df = processed_cached(
+            QUERY_ID_MORPHO_LIQS_FOCUSED, PROCESSING_VERSION,
+            lambda: process_morpho_liquidations(
+                fetch_many([QUERY_ID_MORPHO_LIQS_FOCUSED], force_refresh=args.force_refresh)[QUERY_ID_MORPHO_LIQS_FOCUSED]),
+            reprocess=args.reprocess or args.force_refresh,
+        )
+        print("✅ Successfully loaded data.")
+    except Exception as e:
+        print(f"❌ Error fetching data: {e}")
+        exit()
 
-# --- 5. OUTPUT ---
-output_dir = "outputs"
-module_output_dir = os.path.join(output_dir, "module2_depeg_analysis")
-if not os.path.exists(module_output_dir):
-    os.makedirs(module_output_dir)
-output_path = os.path.join(module_output_dir, "figure_market_wide_dex_volume.png")
-plt.savefig(output_path, dpi=300)
-print(f"✅ Chart saved to '{output_path}'")
+    show_or_close(plot_morpho_liquidations(aligned_df))
 
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()